@@ -1,18 +1,23 @@
 from flask import Flask, request, jsonify
 from flask_cors import CORS
 import requests
+from requests.adapters import HTTPAdapter
 import logging
 import threading
+import queue
 import time
 import socket
 from datetime import datetime
-from collections import defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor, Future, TimeoutError as FutureTimeout
+from collections import OrderedDict
+from functools import partial
 
 # ---------- Network Slicing ----------
-from network_slicing import get_network_slice
+from network_slicing import get_slice_priority
+from compiled_forest import compile_forest
 
 # ---------- 3rd party ----------
-from scapy.all import sniff, IP          # <-- FAST capture
+from scapy.all import AsyncSniffer, IP   # <-- FAST capture
 import joblib
 import numpy as np
 
@@ -24,6 +29,16 @@ CORS(app, origins=["*"])
 logging.basicConfig(level=logging.INFO)
 log = logging.getLogger("SENTINEL")
 
+# === CLOCKS ===
+# Rates, throttles and deadlines only need elapsed time → monotonic clocks.
+# Wall-clock time.time() is kept for timestamps that leave the process.
+_now = time.monotonic
+if hasattr(time, "CLOCK_MONOTONIC_COARSE"):          # Linux: cached jiffy read
+    def _coarse_now() -> float:
+        return time.clock_gettime(time.CLOCK_MONOTONIC_COARSE)
+else:
+    _coarse_now = time.monotonic
+
 # === AUTO-DETECT LAPTOP IP ===
 def get_laptop_ip() -> str:
     s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
@@ -50,12 +65,21 @@ NODE_URL       = f"http://{NODE_HOST}:3000/api/emit-blocked-ip"
 NODE_LIVEPACKET= f"http://{NODE_HOST}:3000/api/live-packet"
 
 MODEL_PATH = "../models/randomforest_enhanced.pkl"
-BLOCKED_IPS    = set()
+
+# One keep-alive session (pooled connections) for every Ryu / Node call
+HTTP = requests.Session()
+HTTP.mount("http://", HTTPAdapter(pool_connections=4, pool_maxsize=32))
+
+# Copy-on-write: writers rebind a new frozenset under _block_lock, so the
+# capture/detector threads can read (`ip in BLOCKED_IPS`) without locking.
+BLOCKED_IPS    = frozenset()
+_block_lock    = threading.Lock()
 running        = False
 
 # === SIMULATED ATTACK / LOCUST SUPPORT ====================
 # Any IPs added here will ALWAYS be treated as malicious.
-FORCE_MALICIOUS_IPS = set()
+# Same copy-on-write rule as BLOCKED_IPS: rebind, never mutate.
+FORCE_MALICIOUS_IPS = frozenset()
 
 # === PROTOCOL NUMBER → NAME MAPPING ===
 PROTOCOL_MAP = {
@@ -70,9 +94,13 @@ PROTOCOL_MAP = {
     # Add more as needed
 }
 
+# IP proto is a single byte → index a 256-entry tuple on the hot path
+PROTOCOL_ARR = tuple(PROTOCOL_MAP.get(i, f"Proto {i}") for i in range(256))
+
 # === LOAD ML MODEL + PRINT EXPECTED FEATURES ===
 model = None
 try:
+    # No mmap_mode: sklearn copies tree nodes into its own buffers on unpickle
     model = joblib.load(MODEL_PATH)
     log.info("ML MODEL LOADED → AI DETECTION ACTIVE")
     log.info(f"   → Model expects {model.n_features_in_} features")
@@ -81,22 +109,71 @@ try:
 except Exception as e:
     log.warning(f"NO ML MODEL FOUND → fallback rule ({e})")
 
+# Native (treelite) predict_proba when available; sklearn's otherwise.
+# The sklearn model is still kept for n_features_in_ / classes_.
+predict_proba = compile_forest(model) if model else None
+if predict_proba:
+    # Warm-up: the first call pays the native library's lazy setup
+    predict_proba(np.zeros((1, model.n_features_in_), dtype=np.float32))
+
 # ==========================================================
-# RYU CONTROLLER: BLOCK / UNBLOCK
+# OUTBOX: fire-and-forget POSTs off the capture / request threads
 # ==========================================================
-def block_ip(ip: str) -> bool:
-    """
-    Install a DROP flow in Ryu to block all IPv4 traffic from `ip`.
-    """
-    if ip in BLOCKED_IPS:
-        return True
+# Callers only put_nowait() (dropping when full); the sender drains a
+# batch every OUTBOX_INTERVAL and issues it concurrently over HTTP.
+OUTBOX_SIZE     = 1024
+OUTBOX_BATCH    = 64
+OUTBOX_INTERVAL = 0.01
+
+outbox     = queue.Queue(maxsize=OUTBOX_SIZE)
+_post_pool = ThreadPoolExecutor(max_workers=8, thread_name_prefix="outbox")
+
+def post_async(url: str, payload: dict, timeout: float = 1):
+    try:
+        outbox.put_nowait((url, payload, timeout))
+    except queue.Full:
+        pass                                  # drop rather than stall capture
+
+def _send(item: tuple):
+    url, payload, timeout = item
+    try:
+        HTTP.post(url, json=payload, timeout=timeout)
+    except Exception:
+        pass
+
+def outbox_worker():
+    while True:
+        batch = [outbox.get()]
+        time.sleep(OUTBOX_INTERVAL)           # let a burst accumulate
+        while len(batch) < OUTBOX_BATCH:
+            try:
+                batch.append(outbox.get_nowait())
+            except queue.Empty:
+                break
+        list(_post_pool.map(_send, batch))    # gather the whole batch
 
-    url = f"{RYU_URL}/stats/flowentry/add"
+threading.Thread(target=outbox_worker, daemon=True, name="outbox").start()
 
+# ==========================================================
+# RYU CONTROLLER: BLOCK / UNBLOCK
+# ==========================================================
+# Blocks are coalesced: block_ip() only enqueues, and the block worker
+# drains up to BLOCK_BATCH IPs every BLOCK_INTERVAL and installs them as one
+# concurrent burst over the keep-alive pool (Ryu's flowentry/add takes a
+# single flow per request). Callers for the same IP share one Future.
+BLOCK_BATCH    = 64
+BLOCK_INTERVAL = 0.02
+BLOCK_TIMEOUT  = 5
+
+_block_q        = queue.SimpleQueue()
+_pending_blocks = {}                      # ip → Future[bool]
+_ryu_pool       = ThreadPoolExecutor(max_workers=16, thread_name_prefix="ryu")
+
+def drop_rule(ip: str) -> dict:
     # IMPORTANT:
     # - dpid must be an INTEGER (our Mininet switch is ID 1)
     # - eth_type=0x0800 to match IPv4 packets
-    rule = {
+    return {
         "dpid": 1,
         "priority": 60000,
         "match": {
@@ -106,23 +183,77 @@ def block_ip(ip: str) -> bool:
         "actions": []  # empty actions => DROP
     }
 
+def _install_drop(ip: str) -> bool:
+    """
+    Install a DROP flow in Ryu to block all IPv4 traffic from `ip`.
+    """
+    global BLOCKED_IPS
     try:
-        r = requests.post(url, json=rule, timeout=3)
+        r = HTTP.post(f"{RYU_URL}/stats/flowentry/add", json=drop_rule(ip), timeout=3)
         if r.ok:
-            BLOCKED_IPS.add(ip)
-            log.warning(f"BLOCKED {ip} → SDN DROP RULE ADDED")
+            with _block_lock:
+                BLOCKED_IPS = BLOCKED_IPS | {ip}
+            log.warning("BLOCKED %s → SDN DROP RULE ADDED", ip)
             return True
         else:
-            log.error(f"RYU flow add failed: {r.status_code} {r.text}")
+            log.error("RYU flow add failed: %s %s", r.status_code, r.text)
     except Exception as e:
-        log.error(f"RYU CONTROLLER UNREACHABLE: {e}")
+        log.error("RYU CONTROLLER UNREACHABLE: %s", e)
     return False
 
+def block_worker():
+    while True:
+        ips = [_block_q.get()]
+        deadline = _now() + BLOCK_INTERVAL
+        while len(ips) < BLOCK_BATCH:
+            timeout = deadline - _now()
+            if timeout <= 0:
+                break
+            try:
+                ips.append(_block_q.get(timeout=timeout))
+            except queue.Empty:
+                break
+        for ip, ok in zip(ips, _ryu_pool.map(_install_drop, ips)):
+            with _block_lock:
+                fut = _pending_blocks.pop(ip)
+            fut.set_result(ok)
+
+threading.Thread(target=block_worker, daemon=True, name="blocker").start()
+
+def request_block(ip: str) -> tuple:
+    """
+    Queue `ip` for the next block burst. Returns (future, created): the
+    future resolves to True once it is blocked; `created` is True only for
+    the caller that queued it, so per-block side effects run once.
+    """
+    if ip in BLOCKED_IPS:
+        fut = Future()
+        fut.set_result(True)
+        return fut, False
+    with _block_lock:
+        fut = _pending_blocks.get(ip)
+        if fut is not None:
+            return fut, False
+        fut = _pending_blocks[ip] = Future()
+        _block_q.put(ip)
+    return fut, True
+
+def block_ip(ip: str) -> bool:
+    """
+    Block `ip` via Ryu and wait for the outcome.
+    """
+    try:
+        return request_block(ip)[0].result(timeout=BLOCK_TIMEOUT)
+    except FutureTimeout:
+        log.error("Timed out blocking %s", ip)
+        return False
+
 
 def unblock_ip(ip: str) -> bool:
     """
     Remove the DROP flow for `ip` from Ryu.
     """
+    global BLOCKED_IPS
     if ip not in BLOCKED_IPS:
         return True
 
@@ -137,34 +268,68 @@ def unblock_ip(ip: str) -> bool:
     }
 
     try:
-        r = requests.post(url, json=rule, timeout=3)
+        r = HTTP.post(url, json=rule, timeout=3)
         if r.ok:
-            BLOCKED_IPS.discard(ip)
-            log.info(f"UNBLOCKED {ip} → SDN DROP RULE REMOVED")
+            with _block_lock:
+                BLOCKED_IPS = BLOCKED_IPS - {ip}
+            log.info("UNBLOCKED %s → SDN DROP RULE REMOVED", ip)
             return True
         else:
-            log.error(f"RYU flow delete failed: {r.status_code} {r.text}")
+            log.error("RYU flow delete failed: %s %s", r.status_code, r.text)
     except Exception as e:
-        log.error(f"Failed to unblock {ip}: {e}")
+        log.error("Failed to unblock %s: %s", ip, e)
     return False
 
 # ==========================================================
 # RATE TRACKER (per source IP) → real PPS for DDoS check
 # ==========================================================
 class RateTracker:
+    """
+    Per-IP sliding window kept as a circular histogram of SLOTS buckets
+    (plus one for the slot expiring out of the window), so add() and pps()
+    cost the same for a flooding IP as for a quiet one.
+    """
+    SLOTS = 10
+
     def __init__(self, window=1.0):
         self.window = window
-        self.timestamps = defaultdict(deque)
+        self.slot_width = window / self.SLOTS
+        self.rates = {}    # ip → [per-slot counts, per-slot ids, newest timestamp]
 
     def add(self, src_ip: str, ts: float):
-        q = self.timestamps[src_ip]
-        q.append(ts)
-        while q and ts - q[0] > self.window:
-            q.popleft()
+        slot = int(ts / self.slot_width)
+        rec = self.rates.get(src_ip)
+        if rec is None:
+            rec = self.rates[src_ip] = [[0] * (self.SLOTS + 1), [-1] * (self.SLOTS + 1), ts]
+        counts, ids, _ = rec
+        i = slot % (self.SLOTS + 1)
+        if ids[i] != slot:                # bucket holds an older window → recycle
+            ids[i] = slot
+            counts[i] = 0
+        counts[i] += 1
+        if ts > rec[2]:
+            rec[2] = ts
 
     def pps(self, src_ip: str) -> float:
-        q = self.timestamps[src_ip]
-        return len(q) / self.window if q else 0.0
+        """
+        Packets in the `window` seconds up to the newest packet. The current
+        slot is only partly elapsed, so the slot SLOTS back is counted for
+        the share of it still inside the window.
+        """
+        rec = self.rates.get(src_ip)
+        if rec is None:
+            return 0.0
+        counts, ids, newest = rec
+        pos = newest / self.slot_width
+        slot = int(pos)
+        oldest = slot - self.SLOTS
+        total = 0.0
+        for c, sid in zip(counts, ids):
+            if sid > oldest:
+                total += c
+            elif sid == oldest:
+                total += c * (1.0 - (pos - slot))
+        return total / self.window
 
 rate_tracker = RateTracker(window=1.0)
 
@@ -173,34 +338,83 @@ rate_tracker = RateTracker(window=1.0)
 # ==========================================================
 EXPECTED_FEATURES = model.n_features_in_ if model else 0
 
-def build_features(pkt_size: int, pps: float) -> list:
-    base = [
-        1,                # packet_count (dummy)
-        pps,              # packets per second
-        pkt_size / 100,   # avg packet size (scaled)
-        0.5,              # protocol entropy (dummy)
-        0.3,              # src-port entropy (dummy)
-        10.0,             # flow duration (dummy)
-        1,                # SYN flag (dummy)
-        1,                # ACK flag (dummy)
-        1                 # is_tcp (dummy)
-    ]
-    if len(base) > EXPECTED_FEATURES:
-        return base[:EXPECTED_FEATURES]
-    elif len(base) < EXPECTED_FEATURES:
-        return base + [0.0] * (EXPECTED_FEATURES - len(base))
-    return base
+# Only the pps and packet-size columns vary; everything else is a dummy
+# constant. Bake the padded/trimmed row once at load time and patch the two
+# live columns in place per packet (no list building, no float64 upcast).
+BASE_FEATURES = [
+    1,                # packet_count (dummy)
+    0.0,              # packets per second         ← PPS_COL
+    0.0,              # avg packet size (scaled)   ← SIZE_COL
+    0.5,              # protocol entropy (dummy)
+    0.3,              # src-port entropy (dummy)
+    10.0,             # flow duration (dummy)
+    1,                # SYN flag (dummy)
+    1,                # ACK flag (dummy)
+    1                 # is_tcp (dummy)
+]
+PPS_COL, SIZE_COL = 1, 2
+
+FEATURE_TEMPLATE = np.zeros(EXPECTED_FEATURES, dtype=np.float32)
+FEATURE_TEMPLATE[:min(len(BASE_FEATURES), EXPECTED_FEATURES)] = BASE_FEATURES[:EXPECTED_FEATURES]
+
+_FEATS = FEATURE_TEMPLATE.reshape(1, -1).copy()
+
+def fill_features(row: np.ndarray, pkt_size: int, pps: float):
+    row[PPS_COL] = pps
+    row[SIZE_COL] = pkt_size / 100
+
+def build_features(pkt_size: int, pps: float) -> np.ndarray:
+    """
+    Returns the shared (1, EXPECTED_FEATURES) float32 buffer, ready for sklearn.
+    """
+    fill_features(_FEATS[0], pkt_size, pps)
+    return _FEATS
+
+# === VERDICT CACHE ===
+# Packets of one flood land in the same (pps, size) bin thousands of times
+# per second, so memoise the forest's verdict per bin. The 30 s epoch in the
+# key lets stale verdicts age out of the LRU on their own.
+VERDICT_CACHE_SIZE = 4096
+VERDICT_TTL        = 30
+
+_verdict_cache = OrderedDict()
+_verdict_lock  = threading.Lock()
+CACHE_HITS     = 0
+
+def verdict_key(pkt_size: int, pps: float) -> tuple:
+    return (int(pps) // 5, pkt_size // 64, int(_now() // VERDICT_TTL))
+
+def cached_verdict(key: tuple):
+    global CACHE_HITS
+    with _verdict_lock:
+        verdict = _verdict_cache.get(key)
+        if verdict is not None:
+            _verdict_cache.move_to_end(key)
+            CACHE_HITS += 1
+        return verdict
+
+def store_verdict(key: tuple, verdict: bool):
+    with _verdict_lock:
+        _verdict_cache[key] = verdict
+        if len(_verdict_cache) > VERDICT_CACHE_SIZE:
+            _verdict_cache.popitem(last=False)
 
 def is_ddos_attack(pkt_size: int, pps: float) -> bool:
     if model:
+        key = verdict_key(pkt_size, pps)
+        verdict = cached_verdict(key)
+        if verdict is not None:
+            return verdict
         try:
-            feats = build_features(pkt_size, pps)
-            pred = model.predict([feats])[0]
-            prob = model.predict_proba([feats])[0].max()
-            return pred == 1 and prob > 0.7
+            # One forest traversal: the class is argmax of the probabilities
+            proba = predict_proba(build_features(pkt_size, pps))[0]
+            best = proba.argmax()
+            verdict = bool(model.classes_[best] == 1 and proba[best] > 0.7)
         except Exception as e:
-            log.error(f"ML predict error: {e}")
+            log.error("ML predict error: %s", e)
             return False
+        store_verdict(key, verdict)
+        return verdict
     else:
         # Simple fallback: treat > 50 pps as DDoS
         return pps > 50
@@ -220,101 +434,221 @@ def is_ddos_attack_for_ip(src_ip: str, pkt_size: int, pps: float, simulated: boo
     # Otherwise, defer to ML / fallback
     return is_ddos_attack(pkt_size, pps)
 
+# ==========================================================
+# MICRO-BATCHED DETECTION (capture thread → detector thread)
+# ==========================================================
+# packet_handler only enqueues; the detector drains up to DETECT_BATCH
+# packets every DETECT_INTERVAL seconds and classifies them with ONE
+# predict_proba call, amortising sklearn's per-call overhead. The queue is
+# bounded: when the detector falls behind, packets are dropped rather than
+# buffered without limit.
+DETECT_QUEUE_SIZE = 4096
+DETECT_BATCH      = 32
+DETECT_INTERVAL   = 0.01
+
+detect_queue = queue.Queue(maxsize=DETECT_QUEUE_SIZE)
+_detect_buf  = np.tile(FEATURE_TEMPLATE, (DETECT_BATCH, 1))
+
+def classify_batch(feats: np.ndarray) -> np.ndarray:
+    """
+    Vectorised is_ddos_attack: one ML verdict per row of `feats`.
+    """
+    try:
+        proba = predict_proba(feats)
+        preds = model.classes_[proba.argmax(1)]
+        return (preds == 1) & (proba.max(1) > 0.7)
+    except Exception as e:
+        log.error("ML batch predict error: %s", e)
+        return None
+
+_iso_cache = (0, "")
+
+def iso_now() -> str:
+    """
+    datetime.now().isoformat() at 1 s resolution, formatted once per second.
+    """
+    global _iso_cache
+    sec = int(time.time())
+    if sec != _iso_cache[0]:
+        _iso_cache = (sec, datetime.fromtimestamp(sec).isoformat())
+    return _iso_cache[1]
+
+def notify_blocked(ip: str, reason: str, threat_level: str, simulated: bool,
+                   network_slice: str, slice_priority: int):
+    """
+    Tell Node about a new block (for the "Blocked Attackers" table).
+    """
+    post_async(NODE_URL, {
+        "ip": ip,
+        "reason": reason,
+        "threatLevel": threat_level,
+        "timestamp": iso_now(),
+        "isSimulated": simulated,
+        "network_slice": network_slice,
+        "slice_priority": slice_priority,
+    })
+
+def handle_detections(batch: list):
+    if not model:
+        # Simple fallback: treat > 50 pps as DDoS
+        verdicts = [pps > 50 for _, _, pps, *_rest in batch]
+    else:
+        keys     = [verdict_key(size, pps) for _, size, pps, *_rest in batch]
+        verdicts = [cached_verdict(key) for key in keys]
+        misses   = {}                         # verdict key → row in _detect_buf
+        for (_, size, pps, *_rest), key, verdict in zip(batch, keys, verdicts):
+            if verdict is None and key not in misses:
+                fill_features(_detect_buf[len(misses)], size, pps)
+                misses[key] = len(misses)
+        if misses:
+            fresh = classify_batch(_detect_buf[:len(misses)])
+            if fresh is not None:
+                for key, row in misses.items():
+                    store_verdict(key, bool(fresh[row]))
+            for i, key in enumerate(keys):
+                if verdicts[i] is None:
+                    verdicts[i] = fresh is not None and bool(fresh[misses[key]])
+
+    forced = FORCE_MALICIOUS_IPS                  # one snapshot per batch
+    pending = set()                               # IPs already requested in this batch
+    for (src_ip, size, pps, protocol_name, network_slice, slice_priority), is_ddos in zip(batch, verdicts):
+        if not (is_ddos or src_ip in forced):
+            continue
+        if src_ip in BLOCKED_IPS or src_ip in pending:
+            continue                              # already blocked + notified
+        pending.add(src_ip)
+        # Never wait on Ryu here: notify from the Future's callback so the
+        # detector goes straight back to draining the queue. Later batches
+        # joining an in-flight block don't add another notification.
+        fut, created = request_block(src_ip)      # whole batch joins one burst
+        if created:
+            fut.add_done_callback(partial(
+                _notify_if_blocked, src_ip,
+                f"DDoS Flood ({pps:.0f} pps, {protocol_name}, slice={network_slice})",
+                network_slice, slice_priority,
+            ))
+
+def _notify_if_blocked(ip: str, reason: str, network_slice: str, slice_priority: int, fut: Future):
+    if fut.result():
+        notify_blocked(ip, reason, "high", False, network_slice, slice_priority)
+
+def detection_worker():
+    while True:
+        batch = [detect_queue.get()]          # block until traffic arrives
+        deadline = _now() + DETECT_INTERVAL
+        while len(batch) < DETECT_BATCH:
+            timeout = deadline - _now()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(detect_queue.get(timeout=timeout))
+            except queue.Empty:
+                break
+        try:
+            handle_detections(batch)
+        except Exception as e:
+            log.error("detection worker error: %s", e)
+
+threading.Thread(target=detection_worker, daemon=True, name="detector").start()
+
 # ==========================================================
 # LIVE-PACKET THROTTLE (max 10 POSTs / sec)
 # ==========================================================
 last_live_ts = 0.0
 LIVE_POST_INTERVAL = 0.1
 
-def throttled_live_post(payload: dict):
+def live_post_due() -> bool:
     global last_live_ts
-    now = time.time()
+    now = _coarse_now()
     if now - last_live_ts >= LIVE_POST_INTERVAL:
-        try:
-            requests.post(NODE_LIVEPACKET, json=payload, timeout=0.1)
-            last_live_ts = now
-        except Exception:
-            pass
+        last_live_ts = now
+        return True
+    return False
+
+def throttled_live_post(payload: dict):
+    if live_post_due():
+        post_async(NODE_LIVEPACKET, payload, timeout=0.1)
 
 # ==========================================================
 # SCAPY CAPTURE LOOP (REAL TRAFFIC)
 # ==========================================================
 def capture_loop():
     global running
-    log.info(f"STARTING FAST SCAPY CAPTURE on Wi-Fi → dst host {LAPTOP_IP}")
+    log.info("STARTING FAST SCAPY CAPTURE on Wi-Fi → dst host %s", LAPTOP_IP)
 
     def packet_handler(pkt):
         if not running:
             return
-        if not pkt.haslayer(IP):
+        ip_layer = pkt.getlayer(IP)           # BPF already limits us to IPv4
+        if ip_layer is None:
             return
 
-        ip_layer = pkt[IP]
         src_ip   = ip_layer.src
+        now      = _now()
+
+        # ---------- KNOWN ATTACKER → verdict already reached ----------
+        # Keep its rate current, but skip slicing, live-post and ML entirely.
+        if src_ip in BLOCKED_IPS:
+            rate_tracker.add(src_ip, now)
+            return
+
         dst_ip   = ip_layer.dst
         size     = len(pkt)
         proto    = ip_layer.proto
 
-        now = time.time()
         rate_tracker.add(src_ip, now)
         pps = rate_tracker.pps(src_ip)
 
         # ---------- PROTOCOL NAME ----------
-        protocol_name = PROTOCOL_MAP.get(proto, f"Proto {proto}")
+        protocol_name = PROTOCOL_ARR[proto]
 
         # ---------- NETWORK SLICING (REAL TRAFFIC) ----------
         try:
-            slice_info = get_network_slice(size, protocol_name, pps)
-            network_slice = slice_info["slice"]
-            slice_priority = slice_info["priority"]
+            network_slice, slice_priority = get_slice_priority(size, protocol_name, pps)
         except Exception as e:
-            log.error(f"network slicing error: {e}")
+            log.error("network slicing error: %s", e)
             network_slice = "eMBB"
             slice_priority = 2
 
         # ---------- LIVE PACKET (throttled) ----------
-        throttled_live_post({
-            "srcIP": src_ip,
-            "dstIP": dst_ip,
-            "protocol": protocol_name,        # "UDP", "TCP", etc.
-            "packetSize": size,
-            "timestamp": int(now * 1000),
-            "network_slice": network_slice,   # slice for frontend
-            "slice_priority": slice_priority  # optional
-            # real captured traffic → no detection flags here
-        })
-
-        # ---------- DDoS DETECTION ----------
-        if is_ddos_attack_for_ip(src_ip, size, pps, simulated=False):
-            if block_ip(src_ip):
-                try:
-                    # also send slice info to Node for "Blocked Attackers" table
-                    requests.post(
-                        NODE_URL,
-                        json={
-                            "ip": src_ip,
-                            "reason": f"DDoS Flood ({pps:.0f} pps, {protocol_name}, slice={network_slice})",
-                            "threatLevel": "high",
-                            "timestamp": datetime.now().isoformat(),
-                            "isSimulated": False,
-                            "network_slice": network_slice,
-                            "slice_priority": slice_priority,
-                        },
-                        timeout=1,
-                    )
-                except Exception:
-                    pass
-
+        # Payload (and its wall-clock stamp) only built when a post is due
+        if live_post_due():
+            post_async(NODE_LIVEPACKET, {
+                "srcIP": src_ip,
+                "dstIP": dst_ip,
+                "protocol": protocol_name,        # "UDP", "TCP", etc.
+                "packetSize": size,
+                "timestamp": int(time.time() * 1000),
+                "network_slice": network_slice,   # slice for frontend
+                "slice_priority": slice_priority  # optional
+                # real captured traffic → no detection flags here
+            }, timeout=0.1)
+
+        # ---------- DDoS DETECTION (batched, off the capture thread) ----------
+        try:
+            detect_queue.put_nowait((src_ip, size, pps, protocol_name, network_slice, slice_priority))
+        except queue.Full:
+            pass                                  # drop rather than grow without bound
+
+    # "ip and ..." is compiled to BPF, so non-IP frames are dropped in the
+    # kernel before they ever reach Scapy.
+    sniffer = AsyncSniffer(
+        iface="Wi-Fi",
+        filter=f"ip and dst host {LAPTOP_IP}",
+        prn=packet_handler,
+        store=False,
+        stop_filter=lambda x: not running
+    )
     try:
-        sniff(
-            iface="Wi-Fi",
-            filter=f"dst host {LAPTOP_IP}",
-            prn=packet_handler,
-            store=False,
-            stop_filter=lambda x: not running
-        )
+        sniffer.start()
+        while running and sniffer.thread.is_alive():
+            time.sleep(0.2)
+        if sniffer.running:
+            sniffer.stop()
+        else:
+            sniffer.join()                    # re-raises a crash in the sniffer thread
     except Exception as e:
-        log.error(f"Scapy capture crashed: {e}")
+        log.error("Scapy capture crashed: %s", e)
     finally:
         running = False
         log.info("CAPTURE THREAD EXITED")
@@ -358,20 +692,20 @@ def simulate_packet():
         )
 
         packet_size = int(data.get("packetSize") or data.get("size") or 0)
-        ts = float(data.get("timestamp") / 1000.0) if data.get("timestamp") else time.time()
+        ts_ms = int(data.get("timestamp") or time.time() * 1000)
         proto = data.get("protocol", "UDP")
 
-        # Update rate tracker (for PPS in reason string)
-        rate_tracker.add(src_ip, ts)
+        # Update rate tracker (for PPS in reason string). Arrival time on our
+        # monotonic clock, not the client's wall-clock stamp, so simulated and
+        # captured packets of one IP share a timeline.
+        rate_tracker.add(src_ip, _now())
         pps = rate_tracker.pps(src_ip)
 
         # ---------- NETWORK SLICING (SIMULATED TRAFFIC) ----------
         try:
-            slice_info = get_network_slice(packet_size, proto, pps)
-            network_slice = slice_info["slice"]
-            slice_priority = slice_info["priority"]
+            network_slice, slice_priority = get_slice_priority(packet_size, proto, pps)
         except Exception as e:
-            log.error(f"network slicing (simulate) error: {e}")
+            log.error("network slicing (simulate) error: %s", e)
             network_slice = "eMBB"
             slice_priority = 2
 
@@ -381,7 +715,7 @@ def simulate_packet():
             "dstIP": dst_ip,
             "protocol": proto,
             "packetSize": packet_size,
-            "timestamp": int(ts * 1000),
+            "timestamp": ts_ms,
             "isMalicious": True,
             "confidence": 0.99,
             "packet_data": {"simulated": True},
@@ -399,25 +733,15 @@ def simulate_packet():
             # block via Ryu
             blocked = block_ip(src_ip)
             if blocked:
-                try:
-                    requests.post(
-                        NODE_URL,
-                        json={
-                            "ip": src_ip,
-                            "reason": f"Simulated DDoS Attack (demo) ({pps:.0f} pps, slice={network_slice})",
-                            "threatLevel": "simulated",
-                            "timestamp": datetime.now().isoformat(),
-                            "isSimulated": True,
-                            "network_slice": network_slice,
-                            "slice_priority": slice_priority,
-                        },
-                        timeout=1,
-                    )
-                except Exception:
-                    pass
+                notify_blocked(
+                    src_ip,
+                    f"Simulated DDoS Attack (demo) ({pps:.0f} pps, slice={network_slice})",
+                    "simulated", True, network_slice, slice_priority,
+                )
 
         log.warning(
-            f"[SIMULATE] FORCED DDOS for {src_ip} (pps={pps:.1f}, simulated={is_simulated}, blocked={blocked}, slice={network_slice})"
+            "[SIMULATE] FORCED DDOS for %s (pps=%.1f, simulated=%s, blocked=%s, slice=%s)",
+            src_ip, pps, is_simulated, blocked, network_slice,
         )
         return jsonify(
             {
@@ -431,7 +755,7 @@ def simulate_packet():
         )
 
     except Exception as e:
-        log.error(f"simulate-packet error: {e}")
+        log.error("simulate-packet error: %s", e)
         return jsonify({"error": str(e)}), 500
 
 
@@ -457,7 +781,7 @@ def stop_capture():
 @app.get("/health")
 def health():
     try:
-        ryu_ok = requests.get(f"{RYU_URL}/stats/switches", timeout=2).ok
+        ryu_ok = HTTP.get(f"{RYU_URL}/stats/switches", timeout=2).ok
     except Exception:
         ryu_ok = False
     return jsonify({
@@ -466,6 +790,7 @@ def health():
         "ryu_reachable": ryu_ok,
         "blocked_ips": len(BLOCKED_IPS),
         "ai_active": model is not None,
+        "cache_hits": CACHE_HITS,
         "capturing": running,
         "model_features": model.n_features_in_ if model else 0
     })
@@ -489,4 +814,11 @@ if __name__ == "__main__":
     log.info(f"Node Backend → {NODE_URL}")
     log.info(f"Ryu Controller → {RYU_URL}")
     log.info("POST http://localhost:5001/start-capture to begin.")
-    app.run(host="0.0.0.0", port=5001, debug=False)
+    try:
+        # Production WSGI server: concurrent Locust requests are served by
+        # a thread pool instead of queueing behind one dev-server thread.
+        from waitress import serve
+        serve(app, host="0.0.0.0", port=5001, threads=16)
+    except ImportError:
+        log.warning("waitress not installed → threaded Flask dev server")
+        app.run(host="0.0.0.0", port=5001, debug=False, threaded=True)
@@ -1,7 +1,93 @@
 # feature_extraction.py
 import numpy as np
+from collections import OrderedDict
 
-flows = {}
+try:
+    from numba import njit
+except ImportError:  # numba is optional → same kernel, plain NumPy
+    def njit(*args, **kwargs):
+        return lambda fn: fn
+
+# LRU of live flows (least recently updated first) so spoofed-source
+# floods cannot grow it without bound.
+MAX_FLOWS    = 50_000
+IDLE_TIMEOUT = 120.0   # seconds without packets before a flow is dropped
+SWEEP_EVERY  = 1.0
+
+flows = OrderedDict()
+_last_sweep = 0.0
+
+def _evict_flows(now):
+    global _last_sweep
+    while len(flows) > MAX_FLOWS:
+        flows.popitem(last=False)
+    if now - _last_sweep >= SWEEP_EVERY:
+        _last_sweep = now
+        # LRU order ≈ end_time order, so idle flows sit at the front
+        while flows:
+            oldest = next(iter(flows.values()))
+            if oldest["end_time"] >= now - IDLE_TIMEOUT:
+                break
+            flows.popitem(last=False)
+
+FWD, BWD = 0, 1
+
+# Streaming moments per sample stream: [n, mean, M2, min, max] (Welford).
+# Keeps feature emission O(1) per packet instead of O(flow length).
+N, MEAN, M2, MIN, MAX = range(5)
+
+def _new_stats():
+    return [0, 0.0, 0.0, float("inf"), float("-inf")]
+
+def _push(stats, x):
+    n = stats[N] + 1
+    delta = x - stats[MEAN]
+    stats[MEAN] += delta / n
+    stats[M2] += delta * (x - stats[MEAN])
+    stats[N] = n
+    if x < stats[MIN]: stats[MIN] = x
+    if x > stats[MAX]: stats[MAX] = x
+
+def _tcp_flags(layer):
+    """
+    TCP flag byte as an int (pyshark exposes tcp.flags as hex, e.g. "0x0012").
+    Bits: FIN=0 SYN=1 RST=2 PSH=3 ACK=4 URG=5 ECE=6 CWR=7.
+    """
+    try:
+        return int(str(getattr(layer, 'flags', 0)), 16)
+    except ValueError:
+        return 0
+
+@njit(cache=True)
+def _flow_kernel(duration, total_pkts, total_bytes, avg_size,
+                 len_n, len_m2, len_min, len_max, iat_n, iat_mean, iat_m2,
+                 syn, psh, ack, is_tcp, is_udp, is_icmp):
+    out = np.empty(17, dtype=np.float32)
+    span = max(duration, 1e-6)
+    out[0] = duration
+    out[1] = total_pkts
+    out[2] = total_bytes
+    out[3] = total_pkts / span
+    out[4] = total_bytes / span
+    out[5] = avg_size
+    if len_n > 0:
+        out[6] = np.sqrt(len_m2 / len_n)
+        out[7] = len_min
+        out[8] = len_max
+    else:
+        out[6] = out[7] = out[8] = 0.0
+    if iat_n > 0:
+        out[9] = iat_mean
+        out[10] = np.sqrt(iat_m2 / iat_n)
+    else:
+        out[9] = out[10] = 0.0
+    out[11] = syn
+    out[12] = psh
+    out[13] = ack
+    out[14] = is_tcp
+    out[15] = is_udp
+    out[16] = is_icmp
+    return out
 
 def calculate_flow_features(packet):
     if not hasattr(packet, 'ip') or not hasattr(packet, 'transport_layer'):
@@ -15,115 +101,88 @@ def calculate_flow_features(packet):
     
     flow_id = (src_ip, dst_ip, src_port, dst_port, protocol)
     
-    if flow_id not in flows:
+    if flow_id in flows:
+        flows.move_to_end(flow_id)
+    else:
         flows[flow_id] = {
             "start_time": float(packet.sniff_time.timestamp()),
             "end_time": float(packet.sniff_time.timestamp()),
-            "total_fwd_packets": 0, "total_bwd_packets": 0,
-            "total_length_of_fwd_packets": 0, "total_length_of_bwd_packets": 0,
-            "fwd_packet_lengths": [], "bwd_packet_lengths": [],
-            "fwd_iat_times": [], "bwd_iat_times": [],
-            "last_fwd_packet_time": None, "last_bwd_packet_time": None,
+            # Per-direction counters are [fwd, bwd] pairs indexed by FWD / BWD
+            "total_packets": [0, 0],
+            "total_length": [0, 0],
+            # fwd + bwd samples share one accumulator: features only use the union
+            "packet_length_stats": _new_stats(), "iat_stats": _new_stats(),
+            "last_packet_time": [None, None],
             "syn_flag_count": 0, "fin_flag_count": 0, "rst_flag_count": 0,
             "psh_flag_count": 0, "ack_flag_count": 0, "urg_flag_count": 0,
             "ece_flag_count": 0, "cwe_flag_count": 0,
-            "fwd_psh_flags": 0, "bwd_psh_flags": 0,
-            "fwd_urg_flags": 0, "bwd_urg_flags": 0,
+            "psh_flags": [0, 0],
+            "urg_flags": [0, 0],
             "fwd_header_length": int(getattr(packet[protocol], 'hdr_len', 0)), "bwd_header_length": 0,
             "init_win_bytes_forward": int(getattr(packet[protocol], 'window_size', 0)),
             "init_win_bytes_backward": None,
-            "act_data_pkt_fwd": 0, "act_data_pkt_bwd": 0,
+            "act_data_pkt": [0, 0],
             "min_seg_size_forward": None, "down_up_ratio": 0,
             "average_packet_size": 0
         }
+        _evict_flows(float(packet.sniff_time.timestamp()))
 
     flow = flows[flow_id]
     flow["end_time"] = float(packet.sniff_time.timestamp())
 
-    is_fwd = src_ip < dst_ip  # Simple way to determine direction
+    d = FWD if src_ip < dst_ip else BWD  # Simple way to determine direction
+    now = float(packet.sniff_time.timestamp())
 
     length = int(packet.length)
-    
-    if is_fwd:
-        flow["total_fwd_packets"] += 1
-        flow["total_length_of_fwd_packets"] += length
-        flow["fwd_packet_lengths"].append(length)
-        if flow["last_fwd_packet_time"] is not None:
-            iat = float(packet.sniff_time.timestamp()) - flow["last_fwd_packet_time"]
-            flow["fwd_iat_times"].append(iat)
-        flow["last_fwd_packet_time"] = float(packet.sniff_time.timestamp())
-        flow["act_data_pkt_fwd"] += 1 if length > 0 else 0
+
+    flow["total_packets"][d] += 1
+    flow["total_length"][d] += length
+    _push(flow["packet_length_stats"], length)
+    last = flow["last_packet_time"]
+    if last[d] is not None:
+        _push(flow["iat_stats"], now - last[d])
+    last[d] = now
+    flow["act_data_pkt"][d] += 1 if length > 0 else 0
+
+    # Direction-specific extras
+    if d == FWD:
         if flow["min_seg_size_forward"] is None or length < flow["min_seg_size_forward"]:
             flow["min_seg_size_forward"] = length
-        if hasattr(packet[protocol], 'flags'):
-            flags = packet[protocol].flags
-            if 'SYN' in flags: flow["syn_flag_count"] += 1
-            if 'FIN' in flags: flow["fin_flag_count"] += 1
-            if 'RST' in flags: flow["rst_flag_count"] += 1
-            if 'PSH' in flags: 
-                flow["psh_flag_count"] += 1
-                flow["fwd_psh_flags"] += 1
-            if 'ACK' in flags: flow["ack_flag_count"] += 1
-            if 'URG' in flags: 
-                flow["urg_flag_count"] += 1
-                flow["fwd_urg_flags"] += 1
-            if 'ECE' in flags: flow["ece_flag_count"] += 1
-            if 'CWR' in flags: flow["cwe_flag_count"] += 1
-    else:
-        flow["total_bwd_packets"] += 1
-        flow["total_length_of_bwd_packets"] += length
-        flow["bwd_packet_lengths"].append(length)
-        if flow["last_bwd_packet_time"] is not None:
-            iat = float(packet.sniff_time.timestamp()) - flow["last_bwd_packet_time"]
-            flow["bwd_iat_times"].append(iat)
-        flow["last_bwd_packet_time"] = float(packet.sniff_time.timestamp())
-        flow["act_data_pkt_bwd"] += 1 if length > 0 else 0
-        if flow["init_win_bytes_backward"] is None:
-            flow["init_win_bytes_backward"] = int(getattr(packet[protocol], 'window_size', 0))
-        if hasattr(packet[protocol], 'flags'):
-            flags = packet[protocol].flags
-            if 'PSH' in flags: 
-                flow["psh_flag_count"] += 1
-                flow["bwd_psh_flags"] += 1
-            if 'URG' in flags: 
-                flow["urg_flag_count"] += 1
-                flow["bwd_urg_flags"] += 1
-            if 'SYN' in flags: flow["syn_flag_count"] += 1
-            if 'FIN' in flags: flow["fin_flag_count"] += 1
-            if 'RST' in flags: flow["rst_flag_count"] += 1
-            if 'ACK' in flags: flow["ack_flag_count"] += 1
-            if 'ECE' in flags: flow["ece_flag_count"] += 1
-            if 'CWR' in flags: flow["cwe_flag_count"] += 1
-
-    if flow["total_bwd_packets"] > 0:
-        flow["down_up_ratio"] = flow["total_fwd_packets"] / flow["total_bwd_packets"]
-    total_pkts = flow["total_fwd_packets"] + flow["total_bwd_packets"]
+    elif flow["init_win_bytes_backward"] is None:
+        flow["init_win_bytes_backward"] = int(getattr(packet[protocol], 'window_size', 0))
+
+    f = _tcp_flags(packet[protocol])
+    flow["fin_flag_count"] += f & 1
+    flow["syn_flag_count"] += (f >> 1) & 1
+    flow["rst_flag_count"] += (f >> 2) & 1
+    flow["psh_flag_count"] += (f >> 3) & 1
+    flow["psh_flags"][d]   += (f >> 3) & 1
+    flow["ack_flag_count"] += (f >> 4) & 1
+    flow["urg_flag_count"] += (f >> 5) & 1
+    flow["urg_flags"][d]   += (f >> 5) & 1
+    flow["ece_flag_count"] += (f >> 6) & 1
+    flow["cwe_flag_count"] += (f >> 7) & 1
+
+    fwd_pkts, bwd_pkts = flow["total_packets"]
+    if bwd_pkts > 0:
+        flow["down_up_ratio"] = fwd_pkts / bwd_pkts
+    total_pkts = fwd_pkts + bwd_pkts
+    total_bytes = flow["total_length"][FWD] + flow["total_length"][BWD]
     if total_pkts > 0:
-        flow["average_packet_size"] = (
-            flow["total_length_of_fwd_packets"] + flow["total_length_of_bwd_packets"]
-        ) / total_pkts
-
-    all_pkt_lengths = flow["fwd_packet_lengths"] + flow["bwd_packet_lengths"]
-    all_iat = flow["fwd_iat_times"] + flow["bwd_iat_times"]
-
-    features = [
-        flow["end_time"] - flow["start_time"],  # Duration
-        total_pkts,  # Total packets
-        flow["total_length_of_fwd_packets"] + flow["total_length_of_bwd_packets"],  # Total bytes
-        total_pkts / max(flow["end_time"] - flow["start_time"], 1e-6),  # Pkts/s
-        (flow["total_length_of_fwd_packets"] + flow["total_length_of_bwd_packets"]) / max(flow["end_time"] - flow["start_time"], 1e-6),  # Bytes/s
-        flow["average_packet_size"],  # Avg pkt size
-        np.std(all_pkt_lengths) if all_pkt_lengths else 0,  # Std pkt size
-        min(all_pkt_lengths) if all_pkt_lengths else 0,  # Min pkt size
-        max(all_pkt_lengths) if all_pkt_lengths else 0,  # Max pkt size
-        np.mean(all_iat) if all_iat else 0,  # Avg IAT
-        np.std(all_iat) if all_iat else 0,  # Std IAT
-        flow["syn_flag_count"],  # SYN count
-        flow["psh_flag_count"],  # PSH count
-        flow["ack_flag_count"],  # ACK count
-        1 if protocol == 'tcp' else 0,  # is_tcp
-        1 if protocol == 'udp' else 0,  # is_udp
-        1 if protocol == 'icmp' else 0   # is_icmp
-    ]
-
-    return np.array(features, dtype=np.float32)
\ No newline at end of file
+        flow["average_packet_size"] = total_bytes / total_pkts
+
+    lengths, iats = flow["packet_length_stats"], flow["iat_stats"]
+    return _flow_kernel(
+        flow["end_time"] - flow["start_time"],
+        total_pkts,
+        total_bytes,
+        flow["average_packet_size"],
+        lengths[N], lengths[M2], lengths[MIN], lengths[MAX],
+        iats[N], iats[MEAN], iats[M2],
+        flow["syn_flag_count"],
+        flow["psh_flag_count"],
+        flow["ack_flag_count"],
+        1 if protocol == 'tcp' else 0,
+        1 if protocol == 'udp' else 0,
+        1 if protocol == 'icmp' else 0,
+    )
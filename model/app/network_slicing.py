@@ -3,6 +3,8 @@
 # ==============================================================
 
 from datetime import datetime
+from functools import lru_cache
+import numpy as np
 
 # ==============================================================
 # 5G/6G SLICE DEFINITIONS
@@ -29,6 +31,18 @@ SLICE_DEFINITIONS = {
     }
 }
 
+# Static part of each slice's policy; only the timestamp varies per call
+_POLICY_TEMPLATE = {
+    name: {
+        "slice": name,
+        "priority": d["priority"],
+        "bandwidth_weight": d["bandwidth_weight"],
+        "description": d["description"],
+        "ideal_use": d["ideal_use"],
+    }
+    for name, d in SLICE_DEFINITIONS.items()
+}
+
 # ==============================================================
 # SELECT SLICE BASED ON PACKET FEATURES
 # ==============================================================
@@ -58,21 +72,21 @@ def classify_slice(packet_size: int, protocol: str, pps: float) -> str:
 # SLICE POLICY RESPONSE
 # ==============================================================
 
-def apply_slice_policy(slice_name: str) -> dict:
+def apply_slice_policy(slice_name: str, timestamp: bool = True) -> dict:
     """
     Returns QoS policy parameters for controllers, logs, frontend etc.
-    """
 
-    slice_info = SLICE_DEFINITIONS.get(slice_name, SLICE_DEFINITIONS["eMBB"])
+    timestamp=False returns the shared, precomputed policy dict without a
+    timestamp — treat it as read-only.
+    """
 
-    return {
-        "slice": slice_name,
-        "priority": slice_info["priority"],
-        "bandwidth_weight": slice_info["bandwidth_weight"],
-        "description": slice_info["description"],
-        "ideal_use": slice_info["ideal_use"],
-        "timestamp": datetime.now().isoformat()
-    }
+    base = _POLICY_TEMPLATE.get(slice_name)
+    if base is None:
+        # Unknown slice → eMBB parameters under the requested name
+        base = {**_POLICY_TEMPLATE["eMBB"], "slice": slice_name}
+    if not timestamp:
+        return base
+    return {**base, "timestamp": datetime.now().isoformat()}
 
 
 # ==============================================================
@@ -99,3 +113,58 @@ def get_network_slice(packet_size: int, protocol: str, pps: float) -> dict:
 
     slice_name = classify_slice(packet_size, protocol, pps)
     return apply_slice_policy(slice_name)
+
+
+
+# ==============================================================
+# FAST PATH FOR PER-PACKET CALLERS → (slice, priority)
+# ==============================================================
+
+# Buckets sit exactly on classify_slice's thresholds (size 200; pps 20/200),
+# so each bucket has a single answer and the LUT is exact, not approximate.
+_SIZE_REP = (0, 200)             # small (< 200), not small
+_PPS_REP  = (0.0, 20.0, 201.0)  # < 20, 20–200, > 200
+
+@lru_cache(maxsize=512)
+def _slice_lut(protocol: str, size_bucket: int, pps_bucket: int) -> tuple:
+    slice_name = classify_slice(_SIZE_REP[size_bucket], protocol, _PPS_REP[pps_bucket])
+    return slice_name, SLICE_DEFINITIONS[slice_name]["priority"]
+
+
+def get_slice_priority(packet_size: int, protocol: str, pps: float) -> tuple:
+    """
+    Same slice as get_network_slice(), minus the policy dict and timestamp.
+
+    RETURNS:
+        ("eMBB", 2)
+    """
+    size_bucket = 0 if packet_size < 200 else 1
+    pps_bucket = 0 if pps < 20 else 1 if pps <= 200 else 2
+    return _slice_lut(protocol, size_bucket, pps_bucket)
+
+
+# ==============================================================
+# BATCHED PATH → arrays of packets at once
+# ==============================================================
+
+def classify_slice_batch(sizes: np.ndarray, protos: np.ndarray, pps: np.ndarray) -> np.ndarray:
+    """
+    Vectorised classify_slice(): same rules, applied element-wise.
+    """
+    sizes, protos, pps = np.asarray(sizes), np.asarray(protos), np.asarray(pps)
+    out = np.full(sizes.shape, "eMBB", dtype="<U5")
+    out[(sizes < 200) & (pps < 20)] = "mMTC"
+    out[(pps > 200) | (protos == "ICMP")] = "URLLC"   # URLLC wins over mMTC
+    return out
+
+
+def get_network_slice_batch(sizes: np.ndarray, protos: np.ndarray, pps: np.ndarray) -> list:
+    """
+    get_network_slice() for a whole batch; every policy dict carries the
+    same timestamp.
+    """
+    timestamp = datetime.now().isoformat()
+    return [
+        {**_POLICY_TEMPLATE[name], "timestamp": timestamp}
+        for name in classify_slice_batch(sizes, protos, pps).tolist()
+    ]
@@ -2,80 +2,142 @@
 import time
 import threading
 from functools import wraps
-from collections import defaultdict, deque
+from concurrent.futures import Future
+from collections import OrderedDict, deque
 
 class PerformanceCache:
     def __init__(self, max_size=1000, ttl=30):
-        self.cache = {}
-        self.access_times = {}
+        self.cache = OrderedDict()   # key -> (value, expiry in monotonic ns), oldest first
         self.max_size = max_size
-        self.ttl = ttl
-        self.lock = threading.RLock()
-        self.metrics = defaultdict(deque)
+        self.ttl = ttl               # seconds; expiries are kept in integer ns
+        # Plain (non-reentrant) lock held only around the OrderedDict ops;
+        # clock reads and allocations happen outside it
+        self.lock = threading.Lock()
+        self.metrics = {}            # endpoint -> deque(maxlen=100), appended lock-free
+        self._inflight = {}          # key -> Future of a call still being computed
         
+    def _get_locked(self, key, now):
+        entry = self.cache.get(key)
+        if entry is not None:
+            value, expiry = entry
+            if expiry > now:
+                self.cache.move_to_end(key)
+                return value
+            # Remove expired entry
+            del self.cache[key]
+        return None
+
     def get(self, key):
+        now = time.monotonic_ns()
         with self.lock:
-            if key in self.cache:
-                # Check if expired
-                if time.time() - self.access_times[key] < self.ttl:
-                    return self.cache[key]
-                else:
-                    # Remove expired entry
-                    del self.cache[key]
-                    del self.access_times[key]
-            return None
+            return self._get_locked(key, now)
     
-    def set(self, key, value):
+    def set(self, key, value, ttl=None, now=None):
+        if now is None:
+            now = time.monotonic_ns()
+        entry = (value, now + int((self.ttl if ttl is None else ttl) * 1_000_000_000))
         with self.lock:
-            # Remove oldest entries if cache is full
-            if len(self.cache) >= self.max_size:
-                oldest_key = min(self.access_times.keys(), key=lambda k: self.access_times[k])
-                del self.cache[oldest_key]
-                del self.access_times[oldest_key]
-            
-            self.cache[key] = value
-            self.access_times[key] = time.time()
-    
-    def add_metric(self, endpoint, duration):
+            if key in self.cache:
+                self.cache.move_to_end(key)
+            elif len(self.cache) >= self.max_size:
+                # Evict least recently used entry
+                self.cache.popitem(last=False)
+            self.cache[key] = entry
+
+    def claim(self, key, now=None):
+        """
+        (value, None, False) on a hit. On a miss, (None, future, owner):
+        the owner computes, resolves the future and calls release(key);
+        everyone else waits on the future.
+        """
+        if now is None:
+            now = time.monotonic_ns()
+        with self.lock:
+            value = self._get_locked(key, now)
+            if value is not None:
+                return value, None, False
+            fut = self._inflight.get(key)
+            if fut is not None:
+                return None, fut, False
+            fut = self._inflight[key] = Future()
+            return None, fut, True
+
+    def release(self, key):
         with self.lock:
-            self.metrics[endpoint].append((time.time(), duration))
-            # Keep only last 100 metrics per endpoint
-            if len(self.metrics[endpoint]) > 100:
-                self.metrics[endpoint].popleft()
+            del self._inflight[key]
+    
+    def add_metric(self, endpoint, duration, timestamp=None):
+        # deque.append and dict.setdefault are atomic under the GIL
+        samples = self.metrics.get(endpoint)
+        if samples is None:
+            samples = self.metrics.setdefault(endpoint, deque(maxlen=100))
+        samples.append((time.monotonic_ns() if timestamp is None else timestamp, duration))
     
     def get_average_response_time(self, endpoint):
-        with self.lock:
-            if endpoint not in self.metrics or not self.metrics[endpoint]:
-                return 0
-            durations = [duration for _, duration in self.metrics[endpoint]]
-            return sum(durations) / len(durations)
+        samples = tuple(self.metrics.get(endpoint, ()))   # snapshot; writers don't lock
+        if not samples:
+            return 0
+        return sum(duration for _, duration in samples) / len(samples)
 
 # Global cache instance
 performance_cache = PerformanceCache()
 
+def _freeze(obj):
+    """
+    Hashable stand-in for dict/list/set arguments (lru_cache-style keying).
+    Containers are tagged with their type, so a dict, a list of pairs and a
+    tuple never share a key.
+    """
+    if isinstance(obj, dict):
+        return (dict, tuple(sorted((k, _freeze(v)) for k, v in obj.items())))
+    if isinstance(obj, list):
+        return (list, tuple(_freeze(v) for v in obj))
+    if isinstance(obj, tuple):
+        return (tuple, tuple(_freeze(v) for v in obj))
+    if isinstance(obj, (set, frozenset)):
+        return (type(obj), frozenset(_freeze(v) for v in obj))
+    return obj
+
 def cache_result(ttl=30):
     """Decorator to cache function results for performance"""
     def decorator(func):
         @wraps(func)
         def wrapper(*args, **kwargs):
             # Create cache key from function name and arguments
-            cache_key = f"{func.__name__}:{hash(str(args) + str(sorted(kwargs.items())))}"
+            try:
+                cache_key = (func.__name__, _freeze(args), _freeze(kwargs))
+                hash(cache_key)
+            except TypeError:
+                # Unhashable/unsortable arguments: don't cache
+                return func(*args, **kwargs)
             
-            # Try to get from cache
-            cached_result = performance_cache.get(cache_key)
+            # Try to get from cache; an identical call already running in
+            # another thread is waited on rather than repeated. The clock is
+            # read twice per miss: here and after the call.
+            start = time.monotonic_ns()
+            cached_result, fut, owner = performance_cache.claim(cache_key, start)
             if cached_result is not None:
                 return cached_result
+            if not owner:
+                return fut.result()
             
             # Execute function and cache result
-            start_time = time.time()
-            result = func(*args, **kwargs)
-            duration = (time.time() - start_time) * 1000  # Convert to ms
-            
-            # Cache the result
-            performance_cache.set(cache_key, result)
+            try:
+                result = func(*args, **kwargs)
+                end = time.monotonic_ns()
+                duration = (end - start) / 1e6  # Convert to ms
+                
+                # Cache the result
+                performance_cache.set(cache_key, result, ttl, now=end)
+                fut.set_result(result)
+            except BaseException as e:
+                fut.set_exception(e)
+                raise
+            finally:
+                performance_cache.release(cache_key)
             
             # Record performance metric
-            performance_cache.add_metric(func.__name__, duration)
+            performance_cache.add_metric(func.__name__, duration, end)
             
             return result
         return wrapper
@@ -85,11 +147,12 @@ def performance_monitor(func):
     """Decorator to monitor function performance"""
     @wraps(func)
     def wrapper(*args, **kwargs):
-        start_time = time.time()
+        start = time.monotonic_ns()
         try:
             result = func(*args, **kwargs)
-            duration = (time.time() - start_time) * 1000
-            performance_cache.add_metric(func.__name__, duration)
+            end = time.monotonic_ns()
+            duration = (end - start) / 1e6
+            performance_cache.add_metric(func.__name__, duration, end)
             
             # Log slow operations
             if duration > 200:
@@ -99,7 +162,8 @@ def performance_monitor(func):
                 
             return result
         except Exception as e:
-            duration = (time.time() - start_time) * 1000
-            performance_cache.add_metric(f"{func.__name__}_error", duration)
+            end = time.monotonic_ns()
+            duration = (end - start) / 1e6
+            performance_cache.add_metric(f"{func.__name__}_error", duration, end)
             raise e
     return wrapper
\ No newline at end of file
@@ -1,18 +1,32 @@
 # sdn_controller.py
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import logging
+from concurrent.futures import ThreadPoolExecutor
 
 log = logging.getLogger(__name__)
 
 class SDNController:
     def __init__(self, host='127.0.0.1', port=8080):
         self.base_url = f"http://{host}:{port}"
+        # Keep-alive session: rule bursts reuse pooled connections to Ryu.
+        # Only 502/503/504 replies are retried — never connect/read timeouts,
+        # so a hung Ryu still costs a single timeout. Every Ryu call here sets
+        # state (add/delete/block/unblock) and is safe to repeat, so POSTs too.
+        self.session = requests.Session()
+        self.session.headers.update({"Content-Type": "application/json"})
+        retry = Retry(total=3, connect=0, read=0, status=3, backoff_factor=0.1,
+                      status_forcelist=(502, 503, 504), raise_on_status=False,
+                      allowed_methods=frozenset({"GET", "POST"}))
+        self.session.mount("http://", HTTPAdapter(pool_connections=4, pool_maxsize=32, max_retries=retry))
+        self._pool = ThreadPoolExecutor(max_workers=16, thread_name_prefix="ryu")
         log.info(f"SDNController → Ryu at {self.base_url}")
         self._check_connection()
 
     def _check_connection(self):
         try:
-            r = requests.get(f"{self.base_url}/stats/switches", timeout=5)
+            r = self.session.get(f"{self.base_url}/stats/switches", timeout=5)
             if r.status_code == 200:
                 log.info("Ryu controller connected")
             else:
@@ -27,12 +41,17 @@ class SDNController:
             **rule
         }
         try:
-            r = requests.post(url, json=data, timeout=5)
+            r = self.session.post(url, json=data, timeout=5)
             return r.status_code in (200, 201)
         except Exception as e:
             log.error(f"Install flow error: {e}")
             return False
 
+    def install_flow_rules_bulk(self, dpid, rules):
+        """Installs rules concurrently: ~1 RTT instead of N. One bool per rule, in order."""
+        futs = [self._pool.submit(self.install_flow_rule, dpid, r) for r in rules]
+        return [f.result() for f in futs]
+
     def remove_flow_rule(self, dpid, rule):
         url = f"{self.base_url}/stats/flowentry/delete"
         data = {
@@ -40,7 +59,7 @@ class SDNController:
             **rule
         }
         try:
-            r = requests.post(url, json=data, timeout=5)
+            r = self.session.post(url, json=data, timeout=5)
             return r.status_code in (200, 201)
         except Exception as e:
             log.error(f"Remove flow error: {e}")
@@ -50,7 +69,7 @@ class SDNController:
         url = f"{self.base_url}/simpleswitch/block/1"
         data = {"ip": ip}
         try:
-            r = requests.post(url, json=data, timeout=5)
+            r = self.session.post(url, json=data, timeout=5)
             if r.status_code in (200, 201):
                 log.info(f"Blocked IP {ip} on switch 1")
                 return True
@@ -61,11 +80,16 @@ class SDNController:
             log.error(f"Block exception: {e}")
             return False
 
+    def block_ip_bulk(self, ips):
+        """Blocks IPs concurrently. One bool per IP, in order."""
+        futs = [self._pool.submit(self.block_ip, ip) for ip in ips]
+        return [f.result() for f in futs]
+
     def unblock_ip(self, ip):
         url = f"{self.base_url}/simpleswitch/unblock/1"
         data = {"ip": ip}
         try:
-            r = requests.post(url, json=data, timeout=5)
+            r = self.session.post(url, json=data, timeout=5)
             if r.status_code in (200, 201):
                 log.info(f"Unblocked IP {ip} on switch 1")
                 return True